@@ -1,15 +1,23 @@
 #!/usr/bin/env python3
 import csv
+import functools
+import io
 import os
+import re
 import sys
-import math
 import statistics
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
 try:
     import tkinter as tk
     from tkinter import filedialog
 except ImportError:
     tk = None
 
+BEGIN_DATA_RE = re.compile(r'^[ \t]*BEGIN_DATA[ \t]*$', re.M)
+END_DATA_RE = re.compile(r'^[ \t]*END_DATA[ \t]*$', re.M)
+BLANK_LINES_RE = re.compile(r'\n[ \t]*(?=\n)')
+
 
 def browse_files():
     """
@@ -50,31 +58,86 @@ def ask_save_path(default_name):
         return choice or default_name
 
 
+@functools.lru_cache(maxsize=None)
 def read_lab_file(path):
     """
-    Parse a Barbieri .lab/.txt file and return list of (Sample_ID, Chip Coord, L, A, B).
+    Return (Sample_IDs, Chip Coords, (n,3) LAB array) for a Barbieri .lab/.txt file.
+    Parsed arrays are kept in a <path>.npz file beside it and reused while newer than the source.
     """
     if not os.path.isfile(path):
         print(f"ERROR: File not found: {path}", file=sys.stderr)
         sys.exit(1)
-    data = []
+    cache_path = path + '.npz'
+    try:
+        if os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            with np.load(cache_path) as cached:
+                return cached['ids'], cached['coords'], cached['lab']
+    except (OSError, ValueError, KeyError):
+        pass
+    ids, coords, lab = parse_lab_file(path)
+    try:
+        np.savez(cache_path, ids=ids, coords=coords, lab=lab)
+    except OSError:
+        pass
+    return ids, coords, lab
+
+
+def parse_lab_file(path):
+    """
+    Parse a Barbieri .lab/.txt file and return (Sample_IDs, Chip Coords, (n,3) LAB array).
+    """
     with open(path, 'r', encoding='utf-8') as f:
-        in_data = False
-        for line in f:
-            line = line.strip()
-            if line == 'BEGIN_DATA': in_data = True; continue
-            if line == 'END_DATA': break
-            if not in_data or not line: continue
+        text = f.read()
+    block = ''
+    begin = BEGIN_DATA_RE.search(text)
+    if begin:
+        end = END_DATA_RE.search(text, begin.end())
+        block = text[begin.end():end.start() if end else len(text)]
+        block = BLANK_LINES_RE.sub('', block).strip()
+    if not block:
+        return np.empty(0, dtype=str), np.empty(0, dtype=str), np.empty((0,3))
+    try:
+        cols = np.loadtxt(io.StringIO(block), dtype=str, usecols=range(5), ndmin=2, comments=None)
+        lab = cols[:,2:].astype(np.float64)
+    except ValueError:
+        # Short or non-numeric rows: keep only the well-formed ones
+        good = []
+        for line in block.splitlines():
             parts = line.split()
             if len(parts) < 5: continue
-            sid, name, lval, aval, bval = parts[:5]
-            coord = ",".join(list(name))
             try:
-                L, A, B = map(float,(lval,aval,bval))
+                list(map(float,parts[2:5]))
             except ValueError:
                 continue
-            data.append((sid,coord,L,A,B))
-    return data
+            good.append(parts[:5])
+        cols = np.array(good, dtype=str).reshape(-1,5)
+        lab = cols[:,2:].astype(np.float64)
+    return cols[:,0], np.char.join(',', cols[:,1]), lab
+
+
+def compute_pair(orig_base, heal_base, orig_data, heal_index):
+    """
+    Match one Original file against one Healing file.
+    Returns (formatted CSV rows, (n,4) array of ΔL, ΔA, ΔB, ΔE).
+    """
+    orig_ids, orig_coords, orig_all = orig_data
+    heal_rows, heal_all = heal_index
+    keys = []
+    orig_idx = []
+    heal_idx = []
+    for i,key in enumerate(zip(orig_ids.tolist(),orig_coords.tolist())):
+        if key not in heal_rows: continue
+        keys.append(key)
+        orig_idx.append(i)
+        heal_idx.append(heal_rows[key])
+    orig_lab = orig_all[np.array(orig_idx, dtype=np.intp)]
+    heal_lab = heal_all[np.array(heal_idx, dtype=np.intp)]
+    deltas = heal_lab - orig_lab
+    dE = np.sqrt(np.einsum('ij,ij->i', deltas, deltas))
+    pair_deltas = np.column_stack((deltas, dE))
+    values = np.char.mod('%.6f', np.hstack((orig_lab,heal_lab,pair_deltas))).tolist()
+    rows = [[orig_base,heal_base,sid,coord,*v] for (sid,coord),v in zip(keys,values)]
+    return rows, pair_deltas
 
 
 def main():
@@ -115,11 +178,21 @@ def main():
     out_csv = ask_save_path(default_csv)
 
     # 5) Read all selected files
-    data_map = {p: read_lab_file(p) for p in set(originals+healings)}
+    paths = list(set(originals+healings))
+    with ThreadPoolExecutor(max_workers=min(8, len(paths))) as ex:
+        data_map = dict(zip(paths, ex.map(read_lab_file, paths)))
+    # Index each file once: (Sample_ID, Chip Coord) -> row of its (n,3) LAB array
+    lab_index = {}
+    for p, (ids, coords, lab) in data_map.items():
+        key_to_row = {key:i for i,key in enumerate(zip(ids.tolist(),coords.tolist()))}
+        lab_index[p] = (key_to_row, lab)
 
     # 6) Compute and write comparisons
-    global_deltas = []
-    with open(out_csv,'w',newline='',encoding='utf-8') as out:
+    # Every original row matches at most once per healing file
+    upper = sum(len(data_map[o][2]) for o in originals) * len(healings)
+    global_deltas = np.empty((upper,4), dtype=np.float64)
+    cursor = 0
+    with open(out_csv,'w',newline='',encoding='utf-8',buffering=1<<20) as out:
         writer = csv.writer(out)
         writer.writerow([
             'Original File','Healing File','Sample_ID','Chip Coordinate',
@@ -127,36 +200,28 @@ def main():
             'ΔL','ΔA','ΔB','ΔE'
         ])
 
-        # Pairwise Original vs Healing
-        for orig in originals:
-            for heal in healings:
-                # Collect deltas for this pair
-                pair_deltas = []
-                heal_dict = {(s,c):(L,A,B) for s,c,L,A,B in data_map[heal]}
-                for sid,coord,L_o,A_o,B_o in data_map[orig]:
-                    key=(sid,coord)
-                    if key not in heal_dict: continue
-                    L_h,A_h,B_h = heal_dict[key]
-                    dL=L_h-L_o; dA=A_h-A_o; dB=B_h-B_o
-                    dE=math.sqrt(dL**2+dA**2+dB**2)
-                    pair_deltas.append((dL,dA,dB,dE))
-                    global_deltas.append((dL,dA,dB,dE))
-                    writer.writerow([
-                        os.path.basename(orig),os.path.basename(heal),
-                        sid,coord,
-                        f"{L_o:.6f}",f"{A_o:.6f}",f"{B_o:.6f}",
-                        f"{L_h:.6f}",f"{A_h:.6f}",f"{B_h:.6f}",
-                        f"{dL:.6f}",f"{dA:.6f}",f"{dB:.6f}",f"{dE:.6f}"
-                    ])
+        # Pairwise Original vs Healing, computed in worker processes
+        pairs = [(orig, heal) for orig in originals for heal in healings]
+        bases = [(os.path.basename(orig), os.path.basename(heal)) for orig, heal in pairs]
+        chunksize = max(1, len(pairs) // (4 * (os.cpu_count() or 1)))
+        with ProcessPoolExecutor() as ex:
+            results = ex.map(
+                compute_pair,
+                [b[0] for b in bases], [b[1] for b in bases],
+                [data_map[orig] for orig, heal in pairs],
+                [lab_index[heal] for orig, heal in pairs],
+                chunksize=chunksize
+            )
+            for (orig_base, heal_base), (rows, pair_deltas) in zip(bases, results):
+                global_deltas[cursor:cursor+len(pair_deltas)] = pair_deltas
+                cursor += len(pair_deltas)
+                writer.writerows(rows)
                 # Summary for this pair
                 writer.writerow([])
-                writer.writerow([f"Summary {os.path.basename(orig)} vs {os.path.basename(heal)}"])
-                if pair_deltas:
+                writer.writerow([f"Summary {orig_base} vs {heal_base}"])
+                if len(pair_deltas):
                     n=len(pair_deltas)
-                    dL_vals=[d[0] for d in pair_deltas]
-                    dA_vals=[d[1] for d in pair_deltas]
-                    dB_vals=[d[2] for d in pair_deltas]
-                    dE_vals=[d[3] for d in pair_deltas]
+                    dL_vals,dA_vals,dB_vals,dE_vals=pair_deltas.T.tolist()
                     writer.writerow([
                         'Avg ΔL',f"{statistics.mean(dL_vals):.6f}",
                         'Std ΔL',f"{statistics.pstdev(dL_vals):.6f}"
@@ -185,30 +250,27 @@ def main():
 
         # 7) Global summary of all comparisons
         writer.writerow(['Overall Summary Original vs Healing'])
-        if global_deltas:
-            n_all=len(global_deltas)
-            dL_all=[d[0] for d in global_deltas]
-            dA_all=[d[1] for d in global_deltas]
-            dB_all=[d[2] for d in global_deltas]
-            dE_all=[d[3] for d in global_deltas]
+        g = global_deltas[:cursor]
+        if len(g):
+            mu = g.mean(0); sd = g.std(0, ddof=0)
             writer.writerow([
-                'Avg ΔL',f"{statistics.mean(dL_all):.6f}",
-                'Std ΔL',f"{statistics.pstdev(dL_all):.6f}"
+                'Avg ΔL',f"{mu[0]:.6f}",
+                'Std ΔL',f"{sd[0]:.6f}"
             ])
             writer.writerow([
-                'Avg ΔA',f"{statistics.mean(dA_all):.6f}",
-                'Std ΔA',f"{statistics.pstdev(dA_all):.6f}"
+                'Avg ΔA',f"{mu[1]:.6f}",
+                'Std ΔA',f"{sd[1]:.6f}"
             ])
             writer.writerow([
-                'Avg ΔB',f"{statistics.mean(dB_all):.6f}",
-                'Std ΔB',f"{statistics.pstdev(dB_all):.6f}"
+                'Avg ΔB',f"{mu[2]:.6f}",
+                'Std ΔB',f"{sd[2]:.6f}"
             ])
             writer.writerow([
-                'Avg ΔE',f"{statistics.mean(dE_all):.6f}",
-                'Std ΔE',f"{statistics.pstdev(dE_all):.6f}"
+                'Avg ΔE',f"{mu[3]:.6f}",
+                'Std ΔE',f"{sd[3]:.6f}"
             ])
-            pct3_all=sum(1 for x in dE_all if x>3)/n_all*100
-            pct6_all=sum(1 for x in dE_all if x>6)/n_all*100
+            pct3_all=float((g[:,3]>3).mean())*100
+            pct6_all=float((g[:,3]>6).mean())*100
             writer.writerow([
                 'Pct ΔE>3',f"{pct3_all:.2f}%",
                 'Pct ΔE>6',f"{pct6_all:.2f}%"